@@ -3,94 +3,643 @@
 OSA Python Sidecar — semantic memory search via local embeddings.
 
 Reads JSON-RPC requests from stdin (one per line), writes responses to stdout.
-Model: all-MiniLM-L6-v2 (80MB, CPU, 384-dim vectors).
+Model: all-MiniLM-L6-v2 (80MB, CPU, 384-dim vectors), served through ONNX
+Runtime by default; set OSA_SIDECAR_BACKEND=openvino|onnx|torch to choose,
+or OSA_SIDECAR_BACKEND=m2v for static potion-base-8M embeddings (256-dim,
+no transformer pass) on short-query, high-throughput workloads.
+Reindexed vectors are cached in ~/.osa/sidecar-cache, keyed by content hash.
 """
+import os
 import sys
-import json
-import numpy as np
+import queue
+import orjson
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
 from typing import Optional
 
+logger = logging.getLogger("osa-sidecar")
+
+def _env_int(name, default):
+    """Read a positive integer setting; a malformed value falls back to the default."""
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return max(1, int(raw))
+    except ValueError:
+        # Raising here would stop the sidecar before it answers the startup ping
+        logger.warning(f"Ignoring invalid {name}={raw!r}, using {default}")
+        return default
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+M2V_MODEL = "minishlab/potion-base-8M"
+HF_REPO = f"sentence-transformers/{MODEL_NAME}"
+MAX_SEQ_LENGTH = 256  # the model's sentence-transformers truncation length
+# Inference backend: onnx (default), openvino, torch, or m2v
+BACKEND = os.environ.get("OSA_SIDECAR_BACKEND", "onnx").strip().lower()
+# Storage for indexed vectors: int8 (default, 4x smaller), float16 (2x
+# smaller, near-lossless) or float32
+VECTOR_DTYPE = os.environ.get("OSA_SIDECAR_VECTOR_DTYPE", "int8").strip().lower()
+# int8 storage scales each row so its largest component maps onto +-INT8_MAX
+INT8_MAX = 127.0
+# Reindexed vectors persist here so unchanged entries skip re-embedding
+CACHE_DIR = Path(os.environ.get("OSA_SIDECAR_CACHE_DIR", Path.home() / ".osa" / "sidecar-cache"))
+# Names the generation directory holding the current ids/keys/matrix files
+INDEX_MANIFEST = "index.json"
+ENCODE_BATCH_SIZE = 64
+# Recently embedded query/embed/similarity texts, kept as ready vectors
+EMBED_CACHE_SIZE = 4096
+# ONNX Runtime threads per model instance
+INTRA_OP_THREADS = max(1, (os.cpu_count() or 2) // 2)
+# Large reindexes are sharded across this many worker processes, each with
+# its own model; OSA_SIDECAR_WORKERS=1 keeps encoding in-process
+ENCODE_WORKERS = _env_int("OSA_SIDECAR_WORKERS", INTRA_OP_THREADS)
+PARALLEL_MIN_TEXTS = 2 * ENCODE_BATCH_SIZE
+# Pipelined requests already waiting on stdin are handled together, up to
+# OSA_MAX_BATCH at once, so their texts share one encode() call
+MAX_BATCH = _env_int("OSA_MAX_BATCH", 16)
+BATCH_WAIT = 0.002  # seconds to wait for the next queued request
+
+# Invariant: every embedding is L2-normalized when it is encoded
+# (normalize_embeddings=True), so cosine similarity is a plain dot product.
+# The search path relies on this and never computes a norm; reindex checks
+# it when running without -O. The one exception is text with no tokens (the
+# Elixir side sends "" for missing content): model2vec embeds it as the zero
+# vector, which stays zero after normalization and scores 0 against every
+# query, so the check skips zero rows.
+
 # Lazy-loaded model
 _model = None
-_vectors = {}  # entry_id -> numpy array
+_backend = None  # backend that actually loaded
+_matrix = None  # (N, dim) in VECTOR_DTYPE, row i is the embedding of _ids[i]
+_scales = None  # (N,) float32 int8 dequantization factors; None for float storage
+_ids = []
+_keys = []  # content hash of each row, parallel to _ids
+_restored = False  # on-disk index has been mapped in
+_index_model = None  # model that produced the rows in _matrix
+_prefetched = {}  # text -> embedding, batch-encoded for the current batch's first use
+
+def _cpu_has_vnni():
+    """Return True if the CPU advertises AVX-512 VNNI int8 dot-product support."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return "avx512_vnni" in line.split()
+    except OSError:
+        pass
+    return False
+
+def _onnx_file_name():
+    """Pick the ONNX export that runs fastest on this CPU."""
+    if _cpu_has_vnni():
+        # int8 weights, matmuls lowered to VPDPBUSD
+        return "onnx/model_qint8_avx512_vnni.onnx"
+    # FP32 with all graph-level fusions applied
+    return "onnx/model_O3.onnx"
+
+def _openvino_file_name():
+    """Pick the OpenVINO IR that runs fastest on this CPU."""
+    if _cpu_has_vnni():
+        # int8 post-training quantized IR (NNCF)
+        return "openvino/openvino_model_qint8_quantized.xml"
+    return "openvino/openvino_model.xml"
+
+class OrtEncoder:
+    """MiniLM on one persistent ONNX Runtime session, mean-pooled in NumPy.
+
+    Skips the sentence-transformers/PyTorch wrapper entirely and accepts the
+    subset of SentenceTransformer.encode() arguments the handlers use.
+    """
+
+    def __init__(self, file_name, threads=None):
+        import onnxruntime as ort
+        from huggingface_hub import hf_hub_download
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(HF_REPO)
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or INTRA_OP_THREADS
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(hf_hub_download(HF_REPO, file_name), options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, sentences, normalize_embeddings=True, batch_size=32, show_progress_bar=False):
+        import numpy as np
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        # Batch texts of similar length together to keep padding short
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vecs = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            rows = order[start:start + batch_size]
+            pooled = self._embed([texts[i] for i in rows])
+            if vecs.shape[1] == 0:
+                vecs = np.empty((len(texts), pooled.shape[1]), dtype=np.float32)
+            vecs[rows] = pooled
+
+        if normalize_embeddings:
+            vecs /= np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+        return vecs[0] if single else vecs
+
+    def _embed(self, texts):
+        """Mean-pool the last hidden state over each text's real tokens."""
+        import numpy as np
+        tokens = self.tokenizer(texts, padding=True, truncation=True,
+                                max_length=MAX_SEQ_LENGTH, return_tensors="np")
+        feed = {name: arr.astype(np.int64, copy=False)
+                for name, arr in tokens.items() if name in self.input_names}
+        hidden = self.session.run(None, feed)[0]
+        mask = tokens["attention_mask"][..., None].astype(np.float32)
+        return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+class StaticEncoder:
+    """model2vec static embeddings: precomputed token vectors, averaged.
+
+    Accepts the same encode() arguments as OrtEncoder.
+    """
+
+    def __init__(self):
+        from model2vec import StaticModel
+        self.model = StaticModel.from_pretrained(M2V_MODEL)
+
+    def encode(self, sentences, normalize_embeddings=True, batch_size=1024, show_progress_bar=False):
+        import numpy as np
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        vecs = np.asarray(self.model.encode(texts, batch_size=batch_size,
+                                            show_progress_bar=show_progress_bar), dtype=np.float32)
+        if normalize_embeddings:
+            vecs /= np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+        return vecs[0] if single else vecs
+
+def _load_backend(backend):
+    """Instantiate the embedding model on a given inference backend."""
+    # ONNX Runtime and OpenVINO run the graph with fused attention/layer-norm
+    # kernels; the exported files ship with the hub repo and are cached by
+    # huggingface_hub under ~/.cache after the first download
+    if backend == "onnx":
+        return OrtEncoder(_onnx_file_name())
+    if backend == "m2v":
+        return StaticEncoder()
+    from sentence_transformers import SentenceTransformer
+    if backend == "openvino":
+        return SentenceTransformer(MODEL_NAME, backend="openvino",
+                                   model_kwargs={"file_name": _openvino_file_name()})
+    if backend == "torch":
+        return SentenceTransformer(MODEL_NAME)
+    raise ValueError(f"unknown backend: {backend}")
 
 def get_model():
-    global _model
+    global _model, _backend
     if _model is None:
-        import logging
         logging.basicConfig(stream=sys.stderr, level=logging.INFO)
-        logger = logging.getLogger("osa-sidecar")
-        logger.info("Loading embedding model all-MiniLM-L6-v2...")
-        from sentence_transformers import SentenceTransformer
-        _model = SentenceTransformer('all-MiniLM-L6-v2')
-        logger.info("Model loaded successfully")
+        logger.info(f"Loading embedding model ({BACKEND} backend)...")
+        # Try the configured backend first, then fall back to the defaults
+        candidates = [BACKEND] + [b for b in ("onnx", "torch") if b != BACKEND]
+        for backend in candidates:
+            try:
+                _model = _load_backend(backend)
+            except Exception as e:
+                logger.warning(f"Backend {backend} unavailable: {e}")
+                continue
+            _backend = backend
+            logger.info(f"Model loaded successfully (backend: {backend})")
+            break
+        else:
+            raise RuntimeError("no embedding backend could be loaded")
+        _drop_foreign_index()
     return _model
 
+def _model_name(backend):
+    return M2V_MODEL if backend == "m2v" else MODEL_NAME
+
+def _drop_foreign_index():
+    """Forget indexed vectors produced by a model other than the one now loaded."""
+    global _matrix, _scales, _ids, _keys, _index_model
+    if _index_model is not None and _index_model != _model_name(_backend):
+        # A fallback backend must not score against another model's vectors
+        logger.warning(f"Discarding index built with {_index_model}; reindex required")
+        _matrix, _scales, _ids, _keys, _index_model = None, None, [], [], None
+
+def _to_storage(vecs):
+    """Convert (n, dim) unit-norm float embeddings to the configured storage dtype.
+
+    Returns the stored rows and, for int8, the per-row factors that map them
+    back to floats. Each row is scaled by its own max-abs component, which
+    keeps cosine error near 3e-3 where a fixed scale of 127 reached 1.5e-2.
+    """
+    import numpy as np
+    if VECTOR_DTYPE == "int8":
+        scales = np.maximum(np.abs(vecs).max(axis=1), 1e-12) / INT8_MAX
+        return np.round(vecs / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    if VECTOR_DTYPE == "float16":
+        return np.ascontiguousarray(vecs, dtype=np.float16), None
+    return np.ascontiguousarray(vecs, dtype=np.float32), None
+
+_F16_BLOCK_ROWS = 4096
+
+# Optional search kernels, imported on the first search (see _load_kernels)
+simsimd = None  # SIMD dot-product kernels (AVX2/AVX-512/NEON)
+numba = None  # compiled int8 kernel when SimSIMD is missing
+_dot_kernel = None
+_kernels_loaded = False
+
+def _dot_rows(mat, q, out):
+    """out[i] = mat[i] . q, one row per parallel iteration (compiled by Numba)."""
+    for i in numba.prange(mat.shape[0]):
+        s = 0.0
+        for j in range(mat.shape[1]):
+            s += mat[i, j] * q[j]
+        out[i] = s
+
+def _load_kernels():
+    """Import SimSIMD, or Numba as its fallback, the first time search needs them."""
+    global simsimd, numba, _dot_kernel, _kernels_loaded
+    if _kernels_loaded:
+        return
+    _kernels_loaded = True
+    try:
+        import simsimd
+        return
+    except ImportError:
+        simsimd = None
+    try:
+        import numba
+    except ImportError:
+        numba = None
+        return
+    import numpy as np
+    _dot_kernel = numba.njit(parallel=True, fastmath=True, cache=True)(_dot_rows)
+    # Compile (or load from the on-disk cache) the int8 specialization up
+    # front rather than inside the first timed search. Numba specializes on
+    # writability too, and the restored matrix is a read-only mmap
+    warm = np.zeros((1, 384), np.int8)
+    warm.setflags(write=False)
+    _dot_kernel(warm, np.zeros(384, np.int8), np.zeros(1))
+
+def _score_all(query_vec):
+    """Cosine similarity of the query against every stored row."""
+    import numpy as np
+    _load_kernels()
+    # Both sides are normalized, so one matrix-vector product yields every
+    # cosine similarity at once
+    quantized = _matrix.dtype == np.int8
+    if quantized:
+        # Quantize the query the same way and take the int8 dot product; this
+        # streams 4x fewer bytes from memory than float32 rows
+        query, query_scale = _to_storage(query_vec.reshape(1, -1))
+        query = query[0]
+    else:
+        query = query_vec.astype(_matrix.dtype, copy=False)
+
+    if simsimd is not None:
+        # Hand-tuned SIMD kernels beat BLAS sgemv on this skinny 1 x N shape;
+        # float16 rows are widened in-register (F16C) and accumulated in float32
+        scores = np.asarray(simsimd.cdist(query.reshape(1, -1), _matrix, metric="dot")).ravel()
+    elif quantized and _dot_kernel is not None:
+        # NumPy has no int8 BLAS; float32 stays on sgemv, which outruns this loop
+        scores = np.empty(_matrix.shape[0])
+        _dot_kernel(np.asarray(_matrix), query, scores)
+    elif quantized:
+        scores = np.einsum("ij,j->i", _matrix, query, dtype=np.int32)
+    elif _matrix.dtype == np.float16:
+        # NumPy has no float16 BLAS; widen one cache-sized block at a time
+        query = query.astype(np.float32)
+        scores = np.empty(_matrix.shape[0], dtype=np.float32)
+        for start in range(0, _matrix.shape[0], _F16_BLOCK_ROWS):
+            block = _matrix[start:start + _F16_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+    else:
+        scores = _matrix @ query
+
+    if quantized:
+        scores = scores * (_scales * query_scale[0])
+    if _matrix.dtype != np.float32:
+        # Rounding error can push near-identical pairs just past 1.0
+        scores = np.clip(scores, -1.0, 1.0)
+    return scores
+
+def _index_dir():
+    """Cache directory for the configured backend and storage dtype.
+
+    Derived from configuration alone so restoring or clearing the index never
+    loads the model; the manifest records which model actually wrote it.
+    """
+    return CACHE_DIR / f"{_model_name(BACKEND).replace('/', '--')}-{BACKEND}-{VECTOR_DTYPE}"
+
+def _content_key(content):
+    return hashlib.blake2b(content.encode(), digest_size=16).digest()
+
+def _content_key_digest(packed_keys):
+    return hashlib.blake2b(packed_keys, digest_size=16).hexdigest()
+
+def _restore_index():
+    """Map the persisted index in on first use; the matrix is paged in lazily."""
+    import numpy as np
+    global _matrix, _scales, _ids, _keys, _restored, _index_model
+    if _restored:
+        return
+    _restored = True
+    index_dir = _index_dir()
+    if not (index_dir / INDEX_MANIFEST).exists():
+        return
+    try:
+        manifest = orjson.loads((index_dir / INDEX_MANIFEST).read_bytes())
+        gen_dir = index_dir / manifest["generation"]
+        ids = np.load(gen_dir / "ids.npy").tolist()
+        keys = np.load(gen_dir / "keys.npy")
+        matrix = np.load(gen_dir / "matrix.npy", mmap_mode="r")
+        scales = np.load(gen_dir / "scales.npy") if matrix.dtype == np.int8 else None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Ignoring unreadable index cache in {index_dir}: {e}")
+        return
+    if not (len(ids) == len(keys) == matrix.shape[0] == manifest.get("rows")) \
+            or (scales is not None and scales.shape != (len(ids),)) \
+            or _content_key_digest(keys.tobytes()) != manifest.get("keys_digest"):
+        logger.warning(f"Ignoring inconsistent index cache in {index_dir}")
+        return
+    _matrix, _scales, _ids, _keys = matrix, scales, ids, [k.tobytes() for k in keys]
+    _index_model = manifest.get("model")
+    logger.info(f"Restored {len(_ids)} indexed vectors from {index_dir}")
+    if _model is not None:
+        _drop_foreign_index()
+
+def _prune_generations(index_dir, keep=None):
+    """Remove every generation directory except the one the manifest points at."""
+    import shutil
+    for path in index_dir.glob("gen-*"):
+        if path.name != keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+def _persist_index(ids, keys, matrix, scales, model):
+    """Write the index to disk and return the matrix mapped back from it.
+
+    Each write goes to a fresh generation directory; the manifest naming it
+    is swapped in last with an atomic rename, so a failed write leaves the
+    previous generation in place. A live mapping of the old matrix stays
+    valid after its files are removed.
+    """
+    import numpy as np
+    import tempfile
+    import shutil
+    index_dir = _index_dir()
+    manifest_tmp = index_dir / f".{INDEX_MANIFEST}.{os.getpid()}"
+    gen_dir = None
+    try:
+        index_dir.mkdir(parents=True, exist_ok=True)
+        gen_dir = Path(tempfile.mkdtemp(prefix="gen-", dir=index_dir))
+        packed = b"".join(keys)
+        np.save(gen_dir / "ids.npy", np.array(ids, dtype=str))
+        np.save(gen_dir / "keys.npy", np.frombuffer(packed, dtype=np.uint8).reshape(len(keys), -1))
+        np.save(gen_dir / "matrix.npy", matrix)
+        if scales is not None:
+            np.save(gen_dir / "scales.npy", scales)
+        mapped = np.load(gen_dir / "matrix.npy", mmap_mode="r")
+        manifest_tmp.write_bytes(orjson.dumps({
+            "generation": gen_dir.name,
+            "model": model,
+            "rows": len(ids),
+            "keys_digest": _content_key_digest(packed),
+        }))
+        os.replace(manifest_tmp, index_dir / INDEX_MANIFEST)
+    except OSError as e:
+        logger.warning(f"Could not persist index cache to {index_dir}: {e}")
+        manifest_tmp.unlink(missing_ok=True)
+        if gen_dir is not None:
+            shutil.rmtree(gen_dir, ignore_errors=True)
+        return matrix
+    _prune_generations(index_dir, keep=gen_dir.name)
+    return mapped
+
+def _clear_index():
+    index_dir = _index_dir()
+    try:
+        (index_dir / INDEX_MANIFEST).unlink(missing_ok=True)
+    except OSError as e:
+        logger.warning(f"Could not remove index manifest in {index_dir}: {e}")
+        return
+    _prune_generations(index_dir)
+
+class EmbedCache:
+    """Least-recently-used text -> embedding map with hit/miss counters.
+
+    Entries are keyed by the text's 16-byte content hash, so a cached
+    memory entry holds only its digest and vector, never the text itself.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, text):
+        return _content_key(text) in self.entries
+
+    def get(self, text):
+        """Return the cached vector, or None; counts a hit or a miss."""
+        key = _content_key(text)
+        vec = self.entries.get(key)
+        if vec is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return vec
+
+    def put(self, text, vec):
+        key = _content_key(text)
+        vec.setflags(write=False)  # shared between every caller that hits
+        self.entries[key] = vec
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+_embed_cache = EmbedCache(EMBED_CACHE_SIZE)
+
+def _cached_embed(text):
+    """Embed one text; repeated texts are served from the LRU."""
+    vec = _embed_cache.get(text)
+    if vec is None:
+        vec = get_model().encode(text, normalize_embeddings=True)
+        _embed_cache.put(text, vec)
+    return vec
+
+def _encode(texts):
+    """Embed texts through the LRU.
+
+    A text batch-encoded by _prefetch_embeddings was already counted as a
+    miss there, so its first use here takes the prefetched vector directly.
+    """
+    return [_prefetched.pop(t) if t in _prefetched else _cached_embed(t) for t in texts]
+
+def _init_worker(threads):
+    """Pool initializer: load a model sized to this worker's share of the cores."""
+    global INTRA_OP_THREADS
+    INTRA_OP_THREADS = threads
+    os.environ["OMP_NUM_THREADS"] = str(threads)  # torch/openvino backends
+    get_model()
+
+def _encode_shard(texts):
+    """Embed texts with this process's model; also names the model that loaded."""
+    vecs = get_model().encode(texts, normalize_embeddings=True, show_progress_bar=False,
+                              batch_size=ENCODE_BATCH_SIZE)
+    return _model_name(_backend), vecs
+
+def _encode_many(texts):
+    """Embed a bulk list of texts, sharded across worker processes when large.
+
+    Returns (model, embeddings). Workers load their own model and may fall
+    back to a different backend than the parent would, so the caller records
+    the model they report rather than assuming the configured one.
+    """
+    import numpy as np
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    if ENCODE_WORKERS < 2 or len(texts) < PARALLEL_MIN_TEXTS:
+        return _encode_shard(texts)
+
+    threads = max(1, (os.cpu_count() or 2) // ENCODE_WORKERS)
+    step = -(-len(texts) // ENCODE_WORKERS)
+    shards = [texts[i:i + step] for i in range(0, len(texts), step)]
+    logger.info(f"Starting {ENCODE_WORKERS} encode workers ({threads} threads each)")
+    try:
+        # Each worker holds its own model and ORT arena, so the pool lives
+        # only for this call. spawn: forking a process that already holds
+        # ORT/torch threadpools is unsafe
+        with ProcessPoolExecutor(max_workers=ENCODE_WORKERS,
+                                 mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(threads,)) as pool:
+            results = list(pool.map(_encode_shard, shards))
+        models = {model for model, _ in results}
+        if len(models) > 1 or (_backend is not None and models != {_model_name(_backend)}):
+            raise RuntimeError(f"workers loaded {sorted(models)}")
+        return models.pop(), np.concatenate([vecs for _, vecs in results])
+    except Exception as e:
+        logger.warning(f"Parallel encode failed, encoding in-process: {e}")
+        return _encode_shard(texts)
+
 def handle_ping(params):
     return "pong"
 
+def handle_stats(params):
+    """Report embedding cache counters."""
+    return {"embed_cache": {"hits": _embed_cache.hits, "misses": _embed_cache.misses,
+                            "size": len(_embed_cache.entries), "max_size": _embed_cache.max_size}}
+
 def handle_embed(params):
     text = params.get("text", "")
     if not text:
         raise ValueError("missing text param")
-    model = get_model()
-    embedding = model.encode(text, normalize_embeddings=True)
-    return {"embedding": embedding.tolist()}
+    embedding = _encode([text])[0]
+    return {"embedding": embedding}
 
 def handle_search(params):
     """Search stored vectors for the most similar entries to a query."""
+    import numpy as np
     query = params.get("query", "")
     top_k = params.get("top_k", 10)
     if not query:
         raise ValueError("missing query param")
-    if not _vectors:
+    _restore_index()
+    if _matrix is None or not _ids:
         return {"results": []}
 
-    model = get_model()
-    query_vec = model.encode(query, normalize_embeddings=True)
+    query_vec = _encode([query])[0]
+    if _matrix is None:
+        return {"results": []}  # loading the model discarded a foreign index
 
-    # Compute cosine similarity against all stored vectors
-    scores = []
-    for entry_id, vec in _vectors.items():
-        # Both vectors are normalized, so dot product = cosine similarity
-        similarity = float(np.dot(query_vec, vec))
-        scores.append({"id": entry_id, "score": round(similarity, 4)})
+    scores = _score_all(query_vec)
 
-    # Sort by score descending, return top_k
-    scores.sort(key=lambda x: x["score"], reverse=True)
-    return {"results": scores[:top_k]}
+    # Partition out the top_k in O(N), then sort only those k by score
+    k = min(top_k, scores.shape[0])
+    if k <= 0:
+        return {"results": []}
+    idx = np.argpartition(-scores, k - 1)[:k]
+    idx = idx[np.argsort(-scores[idx], kind="stable")]
+    return {"results": [{"id": _ids[i], "score": round(float(scores[i]), 4)} for i in idx]}
 
 def handle_reindex(params):
-    """Receive all memory entries and rebuild the vector store."""
-    global _vectors
+    """Receive all memory entries and rebuild the vector store.
+
+    Entries whose content hash is already indexed reuse their stored row;
+    only new or changed content is embedded.
+    """
+    import numpy as np
+    global _matrix, _scales, _ids, _keys, _restored, _index_model
     entries = params.get("entries", [])
     if not entries:
-        _vectors = {}
+        _matrix, _scales, _ids, _keys, _restored, _index_model = None, None, [], [], True, None
+        _clear_index()
         return {"indexed": 0}
 
-    model = get_model()
+    _restore_index()
     texts = [e.get("content", "") for e in entries]
     ids = [e.get("id", str(i)) for i, e in enumerate(entries)]
-
-    # Batch encode all entries
-    embeddings = model.encode(texts, normalize_embeddings=True, show_progress_bar=False)
-
-    _vectors = {}
-    for entry_id, vec in zip(ids, embeddings):
-        _vectors[entry_id] = vec
-
-    return {"indexed": len(_vectors)}
+    keys = [_content_key(t) for t in texts]
+
+    # Duplicate ids keep their last embedding, as the old dict store did
+    last = {entry_id: i for i, entry_id in enumerate(ids)}
+    if len(last) != len(ids):
+        rows = sorted(last.values())
+        texts = [texts[i] for i in rows]
+        ids = [ids[i] for i in rows]
+        keys = [keys[i] for i in rows]
+
+    cached = {key: row for row, key in enumerate(_keys)}
+    if cached and not all(key in cached for key in keys):
+        # New content needs the model; load it before reusing any rows, since
+        # a fallback backend discards vectors from a different model
+        get_model()
+        cached = {key: row for row, key in enumerate(_keys)}
+    hits = [(i, cached[key]) for i, key in enumerate(keys) if key in cached]
+    misses = [i for i, key in enumerate(keys) if key not in cached]
+
+    fresh = fresh_scales = None
+    if misses:
+        _index_model, embeddings = _encode_many([texts[i] for i in misses])
+        if __debug__:
+            norms = np.linalg.norm(embeddings, axis=1)
+            norms = norms[norms > 0]  # zero vectors for token-less text
+            assert np.allclose(norms, 1.0, atol=1e-4), "encoder returned non-normalized embeddings"
+        fresh, fresh_scales = _to_storage(embeddings)
+    template = fresh if fresh is not None else _matrix
+    matrix = np.empty((len(ids), template.shape[1]), dtype=template.dtype)
+    scales = np.empty(len(ids), dtype=np.float32) if template.dtype == np.int8 else None
+    if hits:
+        rows, old_rows = [i for i, _ in hits], [row for _, row in hits]
+        matrix[rows] = _matrix[old_rows]
+        if scales is not None:
+            scales[rows] = _scales[old_rows]
+    if misses:
+        matrix[misses] = fresh
+        if scales is not None:
+            scales[misses] = fresh_scales
+
+    _matrix = _persist_index(ids, keys, matrix, scales, _index_model)
+    _scales, _ids, _keys = scales, ids, keys
+    logger.info(f"Reindexed {len(ids)} entries ({len(misses)} embedded, {len(hits)} cached)")
+
+    return {"indexed": len(_ids)}
 
 def handle_similarity(params):
     """Compute cosine similarity between two texts."""
+    import numpy as np
     text_a = params.get("text_a", "")
     text_b = params.get("text_b", "")
     if not text_a or not text_b:
         raise ValueError("missing text_a or text_b param")
 
-    model = get_model()
-    vecs = model.encode([text_a, text_b], normalize_embeddings=True)
-    similarity = float(np.dot(vecs[0], vecs[1]))
+    vec_a, vec_b = _encode([text_a, text_b])
+    similarity = float(np.dot(vec_a, vec_b))
     return {"similarity": round(similarity, 4)}
 
 def _decorator_name(node):
@@ -176,6 +725,7 @@ def handle_classify_signal(params):
 
 HANDLERS = {
     "ping": handle_ping,
+    "stats": handle_stats,
     "embed": handle_embed,
     "search": handle_search,
     "reindex": handle_reindex,
@@ -184,12 +734,49 @@ HANDLERS = {
     "classify_signal": handle_classify_signal,
 }
 
-def process_request(line: str) -> str:
-    """Process a single JSON-RPC request line and return a response line."""
+# Text params of the methods whose encodes are shared across a batch
+BATCHED_TEXT_PARAMS = {
+    "embed": ("text",),
+    "similarity": ("text_a", "text_b"),
+}
+
+def _prefetch_embeddings(requests):
+    """Encode the uncached texts of all batchable requests in a single forward pass."""
+    texts = []
+    for req in requests:
+        if not isinstance(req, dict) or not isinstance(req.get("params"), dict):
+            continue
+        for name in BATCHED_TEXT_PARAMS.get(req.get("method"), ()):
+            text = req["params"].get(name)
+            if isinstance(text, str) and text:
+                texts.append(text)
+    texts = [t for t in dict.fromkeys(texts) if t not in _embed_cache]
+    if len(texts) < 2:
+        return  # nothing to share; handlers go through the LRU one by one
     try:
-        req = json.loads(line)
-    except json.JSONDecodeError as e:
-        return json.dumps({"id": None, "error": {"code": -32700, "message": f"parse error: {e}"}})
+        vecs = get_model().encode(texts, normalize_embeddings=True, batch_size=len(texts))
+    except Exception as e:
+        # Each handler encodes on its own and reports its own error
+        logger.warning(f"Batched encode failed: {e}")
+        return
+    _embed_cache.misses += len(texts)
+    for text, vec in zip(texts, vecs):
+        _embed_cache.put(text, vec)
+        _prefetched[text] = vec
+
+# Success responses are framed from fixed bytes around the encoded id and
+# result; same output as dumping {"id": ..., "result": ...} without the dict
+_OK_PREFIX = b'{"id":'
+_OK_MID = b',"result":'
+
+def _dumps(obj) -> bytes:
+    # NumPy arrays serialize natively, without a .tolist() pass
+    return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+
+def _respond(req) -> bytes:
+    """Run one decoded request and return its response line."""
+    if isinstance(req, orjson.JSONDecodeError):
+        return _dumps({"id": None, "error": {"code": -32700, "message": f"parse error: {req}"}})
 
     req_id = req.get("id")
     method = req.get("method", "")
@@ -197,28 +784,79 @@ def process_request(line: str) -> str:
 
     handler = HANDLERS.get(method)
     if handler is None:
-        return json.dumps({"id": req_id, "error": {"code": -32601, "message": f"unknown method: {method}"}})
+        return _dumps({"id": req_id, "error": {"code": -32601, "message": f"unknown method: {method}"}})
 
     try:
         result = handler(params)
-        return json.dumps({"id": req_id, "result": result})
+        return b"".join((_OK_PREFIX, _dumps(req_id), _OK_MID, _dumps(result), b"}"))
     except Exception as e:
-        return json.dumps({"id": req_id, "error": {"code": -1, "message": str(e)}})
+        return _dumps({"id": req_id, "error": {"code": -1, "message": str(e)}})
+
+def process_batch(lines: list) -> list:
+    """Process JSON-RPC request lines together and return their response lines in order."""
+    requests = []
+    for line in lines:
+        try:
+            requests.append(orjson.loads(line))
+        except orjson.JSONDecodeError as e:
+            requests.append(e)
+
+    _prefetch_embeddings(requests)
+    try:
+        return [_respond(req) for req in requests]
+    finally:
+        _prefetched.clear()
+
+def process_request(line: bytes) -> bytes:
+    """Process a single JSON-RPC request line and return a response line."""
+    return process_batch([line])[0]
+
+def _read_lines(stream, lines):
+    """Reader thread: queue each request line as it arrives, then None at EOF."""
+    for line in stream:
+        if line.strip():
+            lines.put(line)
+    lines.put(None)
+
+def _read_batches(stream):
+    """Yield lists of request lines, coalescing requests that are already queued.
+
+    Blocks until a first line arrives, then keeps taking lines that show up
+    within BATCH_WAIT, up to MAX_BATCH per batch. Lines are read on a thread
+    rather than with select(), which only accepts sockets on Windows.
+    """
+    lines = queue.Queue()
+    threading.Thread(target=_read_lines, args=(stream, lines), daemon=True).start()
+    eof = False
+    while not eof:
+        line = lines.get()
+        if line is None:
+            return
+        batch = [line]
+        while len(batch) < MAX_BATCH:
+            try:
+                line = lines.get(timeout=BATCH_WAIT)
+            except queue.Empty:
+                break
+            if line is None:
+                eof = True
+                break
+            batch.append(line)
+        yield batch
 
 def main():
     """Main loop: read JSON-RPC from stdin, write responses to stdout."""
-    import logging
     logging.basicConfig(stream=sys.stderr, level=logging.INFO)
-    logger = logging.getLogger("osa-sidecar")
     logger.info("OSA Python sidecar starting...")
 
-    for line in sys.stdin:
-        line = line.strip()
-        if not line:
-            continue
-        response = process_request(line)
-        sys.stdout.write(response + "\n")
-        sys.stdout.flush()
+    # Responses are already UTF-8 bytes: skip the text layer and make one
+    # flush per drained batch
+    out = sys.stdout.buffer
+    for batch in _read_batches(sys.stdin.buffer):
+        for response in process_batch(batch):
+            out.write(response)
+            out.write(b"\n")
+        out.flush()
 
     logger.info("OSA Python sidecar shutting down (stdin closed)")
 
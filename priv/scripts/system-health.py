@@ -4,9 +4,15 @@ Claude Code Ecosystem Health Check
 Quick diagnostic for optimization system status
 """
 import json
+from collections import Counter
 from pathlib import Path
 from datetime import datetime
 
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
 CLAUDE_DIR = Path.home() / '.claude'
 
 def check_file(path: Path, name: str) -> dict:
@@ -88,13 +94,16 @@ def main():
     # Telemetry summary
     events_file = CLAUDE_DIR / 'telemetry/events.jsonl'
     if events_file.exists():
-        events = [json.loads(l) for l in events_file.read_text().strip().split('\n') if l]
-        print(f"Telemetry: {len(events)} events recorded")
-        event_types = {}
-        for e in events:
-            et = e.get('event_type', 'unknown')
-            event_types[et] = event_types.get(et, 0) + 1
-        for et, count in event_types.items():
+        # Stream line by line: the log grows without bound
+        event_types = Counter()
+        total = 0
+        with events_file.open('rb') as f:
+            for line in f:
+                if line.strip():
+                    total += 1
+                    event_types[json_loads(line).get('event_type', 'unknown')] += 1
+        print(f"Telemetry: {total} events recorded")
+        for et, count in event_types.most_common():
             print(f"  - {et}: {count}")
 
     print()